@@ -64,18 +64,28 @@ Examples
 
 """
 import ast
+import builtins
 import glob
+import hmac
+import io
 import logging
+import marshal
 import os
+import pickle
+import re
+import sys
+import time
 import tokenize
 
 from collections import namedtuple
-from fnmatch import fnmatch
+from fnmatch import fnmatch, translate
+from hashlib import blake2b
 from json import loads as jsonloads, load as jsonload
 from os.path import (
     abspath, basename, exists, isabs, join as joinpath,
     normpath, relpath, splitext
 )
+from stat import S_ISLNK
 from string import Template
 from textwrap import dedent
 
@@ -85,6 +95,23 @@ logger = logging.getLogger('cli.build')
 
 GRAPHVIZ_INDENT = '  '
 
+GRAPHVIZ_PACKAGE = """\
+subgraph cluster_{cid} {{
+  label="{name}";
+  {modules}
+  {packages}
+}}"""
+
+GRAPHVIZ_PROJECT = """\
+graph {{
+  layout=osage
+  subgraph cluster_0 {{
+    label="Project Structure";
+    {modules}
+    {packages}
+  }}
+}}"""
+
 ############################################################
 #
 # Project File View
@@ -94,6 +121,10 @@ GRAPHVIZ_INDENT = '  '
 GLOBAL_EXCLS = '.*', '__pycache__'
 GLOBAL_INCLS = '*.py', '*.pyw'
 
+BUILTIN_NAMES = frozenset(vars(builtins))
+
+MAGIC_CHECK = re.compile('[*?[]')
+
 ProjectItem = namedtuple(
     'ProjectItem',
     ('name', 'src', 'scripts', 'modules', 'packages',
@@ -102,35 +133,256 @@ ProjectItem = namedtuple(
 )
 
 
-def scan_path(path, includes=None, excludes=[], **options):
+def has_magic(s):
+    """Same as glob, check whether there is any magic character"""
+    return MAGIC_CHECK.search(s) is not None
+
+
+def compile_patterns(patterns):
+    """Translate shell patterns to one compiled regex
+
+    Return None if there is no pattern. The patterns only match base
+    name, so it's case insensitive in Windows as `fnmatch` does
+    """
+    if not patterns:
+        return None
+    flags = re.IGNORECASE if os.name == 'nt' else 0
+    return re.compile('|'.join(translate(x) for x in patterns), flags)
+
+
+def scan_path(path, includes=None, excludes=[], excludes_re=None,
+              **options):
+    """If excludes_re is not None, it's used instead of excludes"""
     files, dirs = [], []
-    xlist = includes if includes else GLOBAL_INCLS
+    inc_re = compile_patterns(includes if includes else GLOBAL_INCLS)
+    exc_re = (compile_patterns(excludes) if excludes_re is None
+              else excludes_re)
+
+    # Bind methods to locals for hot loop
+    exc_match = exc_re.match if exc_re else None
+    inc_match = inc_re.match
+    files_append, dirs_append = files.append, dirs.append
     with os.scandir(path) as itdir:
         for et in itdir:
-            if any([fnmatch(et.name, x) for x in excludes]):
+            name = et.name
+            if exc_match and exc_match(name):
                 continue
+            # DirEntry caches file type got from scandir, check name
+            # first so that it needn't query file type for most of
+            # unmatched entries
             if et.is_dir(follow_symlinks=False):
-                dirs.append(et.name)
-            elif (et.is_file(follow_symlinks=False) and
-                  any([fnmatch(et.name, x) for x in xlist])):
-                files.append(et.name)
+                dirs_append(name)
+            elif inc_match(name) and et.is_file(follow_symlinks=False):
+                files_append(name)
     return files, dirs
 
 
-def search_item(root, pattern, excludes, recursive=0):
+def search_item(root, pattern, excludes, recursive=0, excludes_re=None):
     if not pattern:
         return []
 
     sep = os.sep if pattern.endswith(os.sep) else ''
     result = []
 
+    exc_re = (compile_patterns(excludes) if excludes_re is None
+              else excludes_re)
+    exc_match = exc_re.match if exc_re else None
+    result_append = result.append
     pt = pattern if isabs(pattern) else joinpath(root, pattern)
     for item in glob.glob(pt, recursive=recursive):
-        name = basename(item.strip(sep))
-        if excludes and any([fnmatch(name, x) for x in excludes]):
+        if exc_match and exc_match(basename(item.strip(sep))):
+            continue
+        result_append(normpath(item))
+    return result
+
+
+def search_items(root, patterns, excludes, recursive=0, listdirs=None,
+                 excludes_re=None):
+    """Search all the patterns, return unique paths in found order
+
+    If there is magic characters only in the last part of pattern,
+    match it with directory names which are listed once and saved in
+    `listdirs`. Other patterns are still searched by `glob`
+    """
+    if listdirs is None:
+        listdirs = {}
+    exc_re = (compile_patterns(excludes) if excludes_re is None
+              else excludes_re)
+    result = {}
+    for pattern in patterns:
+        pt = pattern if isabs(pattern) else joinpath(root, pattern)
+        path, name = os.path.split(pt)
+        if (not name or has_magic(path) or not has_magic(name)
+                or (recursive and '**' in name)):
+            result.update(dict.fromkeys(
+                search_item(root, pattern, excludes, recursive=recursive,
+                            excludes_re=exc_re)))
             continue
-        result.append(item)
-    return [normpath(x) for x in result]
+
+        names = listdirs.get(path)
+        if names is None:
+            try:
+                names = os.listdir(path if path else os.curdir)
+            except OSError:
+                names = []
+            listdirs[path] = names
+
+        # As glob, hidden names only match pattern starts with "."
+        hidden = name.startswith('.')
+        pat_re = compile_patterns([name])
+        result.update(dict.fromkeys(
+            normpath(joinpath(path, x)) for x in names
+            if (hidden or not x.startswith('.')) and pat_re.match(x)
+            and not (exc_re and exc_re.match(x))
+        ))
+    return list(result)
+
+
+def parse_source(args):
+    """Parse source in worker process
+
+    Return source tree and marshalled code object, because code
+    object can't be pickled. Code is None if optimize is None
+    """
+    filename, source, optimize = args
+    tree = compile(source, filename, 'exec', flags=ast.PyCF_ONLY_AST)
+    if optimize is None:
+        return tree, None
+    co = compile(tree, filename, 'exec', optimize=optimize)
+    return tree, marshal.dumps(co)
+
+
+class SourceCache:
+    """Disk cache of source trees and code objects
+
+    It's disabled by default, enable it by
+
+        pyarmor cfg enable_source_cache=1
+
+    The cache is saved in Pyarmor home path, not in the project. Each
+    entry is signed by HMAC with one private key of this cache, the
+    unsigned or broken entries are ignored
+
+    The entries are only protected when nobody else could write the
+    cache path, so the cache is refused unless the cache path and key
+    file are owned by current user, and not writable by group/others.
+    It's not available if there is no os.getuid, for example, Windows
+
+    The entries not used in `MAX_AGE` seconds, or beyond `MAX_ENTRIES`
+    are removed when the cache is opened
+
+    Any cache error only disables the cache, it never fails building
+    """
+
+    MAX_AGE = 30 * 24 * 3600
+    MAX_ENTRIES = 10000
+
+    KEYNAME = '.key'
+
+    def __init__(self, path):
+        self.path = path
+        self._key = None
+
+    def open(self):
+        """Return False if this cache couldn't be used"""
+        try:
+            os.makedirs(self.path, mode=0o700, exist_ok=True)
+            self._check_owner(self.path, 0o022)
+            self._key = self._read_key()
+            self._prune()
+        except Exception as e:
+            logger.debug('disable source cache "%s": %s', self.path, e)
+            return False
+        return True
+
+    @staticmethod
+    def _check_owner(path, mask):
+        """Raise error if path isn't owned by current user, or it's
+        got any permission in mask"""
+        st = os.lstat(path)
+        if S_ISLNK(st.st_mode):
+            raise PermissionError('"%s" is symbol link' % path)
+        if st.st_uid != os.getuid():
+            raise PermissionError('"%s" is not owned by current user'
+                                  % path)
+        if st.st_mode & mask:
+            raise PermissionError('"%s" is accessible by others' % path)
+
+    def _read_key(self):
+        keyfile = joinpath(self.path, self.KEYNAME)
+        try:
+            fd = os.open(keyfile, os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                         0o600)
+        except FileExistsError:
+            self._check_owner(keyfile, 0o077)
+            with open(keyfile, 'rb') as f:
+                key = f.read()
+            if len(key) != 32:
+                raise ValueError('invalid cache key')
+            return key
+
+        key = os.urandom(32)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(key)
+        return key
+
+    def _prune(self):
+        entries = []
+        with os.scandir(self.path) as itdir:
+            for et in itdir:
+                if et.name != self.KEYNAME and et.is_file():
+                    entries.append((et.stat().st_mtime, et.path))
+        entries.sort(reverse=True)
+
+        expired = time.time() - self.MAX_AGE
+        for i, (mtime, path) in enumerate(entries):
+            if i >= self.MAX_ENTRIES or mtime < expired:
+                os.remove(path)
+
+    def _sign(self, data):
+        return hmac.new(self._key, data, 'sha256').digest()
+
+    def load(self, name, loads):
+        """Return cached object or None if no cache or cache is broken"""
+        filename = joinpath(self.path, name)
+        try:
+            with open(filename, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        sig, payload = data[:32], data[32:]
+        if not hmac.compare_digest(sig, self._sign(payload)):
+            logger.debug('ignore unsigned cache "%s"', filename)
+            return None
+
+        try:
+            obj = loads(payload)
+            # Update mtime so that used entries aren't pruned
+            os.utime(filename)
+        except Exception as e:
+            logger.debug('ignore broken cache "%s": %s', filename, e)
+            return None
+        return obj
+
+    def dump(self, name, obj, dumps):
+        filename = joinpath(self.path, name)
+        tmpname = '%s.%d' % (filename, os.getpid())
+        try:
+            payload = dumps(obj)
+            with open(tmpname, 'wb') as f:
+                f.write(self._sign(payload))
+                f.write(payload)
+            os.replace(tmpname, filename)
+        except Exception as e:
+            # For example, pickle raises RecursionError for deep tree
+            logger.debug('ignore cache error "%s": %s', filename, e)
+        finally:
+            if exists(tmpname):
+                try:
+                    os.remove(tmpname)
+                except OSError:
+                    pass
 
 
 ############################################################
@@ -142,6 +394,9 @@ def search_item(root, pattern, excludes, recursive=0):
 class Module:
     """Module concept"""
 
+    __slots__ = ('parent', '_path', '_name', '_co', '_tree', '_type',
+                 '_shebang', '_digest', '_qualname', '_abspath')
+
     def __init__(self, path, name=None, parent=None):
         self.parent = parent
         self._path = path
@@ -152,6 +407,11 @@ class Module:
         self._type = None
 
         self._shebang = ''
+        self._digest = None
+
+        # Both are fixed once module is in the project tree
+        self._qualname = None
+        self._abspath = None
 
     @property
     def name(self):
@@ -171,21 +431,26 @@ class Module:
 
     @property
     def qualname(self):
-        if isinstance(self.parent, (Project, type(None))):
-            return self._name
-        prefix = self.parent.qualname + ('.' if self.name else '')
-        return prefix + self.name
+        if self._qualname is None:
+            if isinstance(self.parent, (Project, type(None))):
+                self._qualname = self._name
+            else:
+                prefix = self.parent.qualname + ('.' if self.name else '')
+                self._qualname = prefix + self.name
+        return self._qualname
 
     @property
     def project(self):
-        """Return project this module belong to"""
-        return (self.parent if isinstance(self.parent, Project)
+        """Return project this module belong to, or None"""
+        return (self.parent if isinstance(self.parent, (Project, type(None)))
                 else self.parent.project)
 
     @property
     def abspath(self):
-        return (self._path if isabs(self._path) else
-                joinpath(self.parent.abspath, self._path))
+        if self._abspath is None:
+            self._abspath = (self._path if isabs(self._path) else
+                             joinpath(self.parent.abspath, self._path))
+        return self._abspath
 
     @property
     def destpath(self):
@@ -196,33 +461,104 @@ class Module:
     def shebang(self):
         return self._shebang
 
-    def compile_file(self, force=False, optimize=-1):
+    def compile_file(self, force=False, optimize=-1, keep_tree=True):
+        """Compile module to code object
+
+        If keep_tree is False, source tree is released after compiled,
+        it's much larger than code object. Only set it when mtree isn't
+        used any more, otherwise the source is parsed again
+        """
         if self._co is not None and not force:
             return
 
-        self.parse_file(force=force)
+        # Only code object compiled from source tree could be cached,
+        # the tree may be changed after it's parsed
+        fresh = force or self._tree is None
+        if fresh:
+            raw = self._read_source()
+            self._co = self._load_code(optimize)
+            # Needn't source tree if code object is got from cache
+            if self._co is None or keep_tree:
+                self._parse_source(raw)
+
+        if self._co is None:
+            options = {
+                'optimize': optimize
+            }
+            logger.info('compile %s ...', self.qualname)
+            self._co = compile(self._tree, self.abspath, 'exec', **options)
+            logger.info('compile %s end', self.qualname)
+
+            if fresh:
+                self._dump_code(optimize)
 
-        options = {
-            'optimize': optimize
-        }
-        logger.info('compile %s ...', self.qualname)
-        self._co = compile(self._tree, self.abspath, 'exec', **options)
-        logger.info('compile %s end', self.qualname)
+        if not keep_tree:
+            self._tree = None
 
     def parse_file(self, force=False):
         if self._tree is not None and not force:
             return
 
-        filename = self.abspath
-        with open(filename, 'rb') as f:
-            encoding, lines = tokenize.detect_encoding(f.readline)
-            if lines and lines[0].startswith(b'#!'):
-                self._shebang = lines[0].decode(encoding)
+        self._parse_source(self._read_source())
 
-        with open(filename, 'r', encoding=encoding) as f:
+    def _parse_source(self, raw):
+        self._tree = self._load_tree()
+        if self._tree is None:
             logger.info('parse %s ...', self.qualname)
-            self._tree = ast.parse(f.read(), filename, 'exec')
+            self._tree = compile(raw, self.abspath, 'exec',
+                                 flags=ast.PyCF_ONLY_AST)
             logger.info('parse %s end', self.qualname)
+            self._dump_tree()
+
+    def _read_source(self):
+        """Read source, set shebang and digest, return source bytes
+
+        The bytes are parsed directly, compile() handles encoding
+        declaration, so only detect encoding for shebang line
+        """
+        with open(self.abspath, 'rb') as f:
+            raw = f.read()
+
+        if raw.startswith((b'#!', b'\xef\xbb\xbf#!')):
+            readline = io.BytesIO(raw).readline
+            encoding, lines = tokenize.detect_encoding(readline)
+            self._shebang = lines[0].decode(encoding)
+
+        if self._source_cache():
+            self._digest = blake2b(raw, digest_size=16).hexdigest()
+        return raw
+
+    def _load_tree(self):
+        """Return source tree in cache, or None"""
+        cache = self._source_cache()
+        if cache:
+            return cache.load(self._digest + '.ast', pickle.loads)
+
+    def _dump_tree(self):
+        cache = self._source_cache()
+        if cache:
+            cache.dump(self._digest + '.ast', self._tree, pickle.dumps)
+
+    def _load_code(self, optimize):
+        cache = self._source_cache()
+        if cache:
+            return cache.load(self._code_name(optimize), marshal.loads)
+
+    def _dump_code(self, optimize):
+        cache = self._source_cache()
+        if cache:
+            cache.dump(self._code_name(optimize), self._co, marshal.dumps)
+
+    def _code_name(self, optimize):
+        level = sys.flags.optimize if optimize == -1 else optimize
+        key = blake2b(self._digest.encode() + self.abspath.encode(),
+                      digest_size=16).hexdigest()
+        return '%s.opt%d.code' % (key, level)
+
+    def _source_cache(self):
+        """Return None if no project or source cache is disabled"""
+        project = self.project
+        return None if project is None else project.srccache
 
     def _as_dot(self):
         return self.name
@@ -231,6 +567,8 @@ class Module:
 class Script(Module):
     """Script concept"""
 
+    __slots__ = ()
+
     @property
     def rpaths(self):
         """Extra Python paths for importing module
@@ -252,6 +590,8 @@ class Script(Module):
 class Package(Module):
     """Package concept"""
 
+    __slots__ = ('_modules', '_packages', '_excludes', '_filters')
+
     def __init__(self, path, name=None, parent=None, excludes=[]):
         super().__init__(path, name=name, parent=parent)
 
@@ -303,26 +643,20 @@ class Package(Module):
             yield x
 
     def iter_module(self):
-        if self._modules is None or self._packages is None:
-            self.load()
-
-        for x in self._modules:
-            yield x
-
-        for pkg in self._packages:
-            for x in pkg.iter_module():
-                yield x
+        # Walk package tree by stack, pop packages in original order
+        stack = [self]
+        while stack:
+            pkg = stack.pop()
+            if pkg._modules is None or pkg._packages is None:
+                pkg.load()
+            yield from pkg._modules
+            stack.extend(reversed(pkg._packages))
 
     def _as_dot(self, n=0):
         modules = [x._as_dot() for x in self.modules]
         packages = [x._as_dot(n+1) for x in self.packages]
         sep = '\n' + GRAPHVIZ_INDENT
-        source = Template(dedent("""\
-        subgraph cluster_$cid {
-          label="$name";
-          $modules
-          $packages
-        }""")).substitute(
+        source = GRAPHVIZ_PACKAGE.format(
             cid=id(self),
             name=self.name,
             modules=sep.join(modules),
@@ -373,6 +707,18 @@ class Project:
 
     """
 
+    __slots__ = ('ctx', 'src',
+                 '_scripts', '_modules', '_packages', '_namespaces',
+                 '_rft_options', '_rft_filters', '_rft_rulers',
+                 '_rft_option_lines', '_rft_filter_lines',
+                 '_rmodules', '_builtins', '_srccache',
+                 '_rft_type_rules', '_rft_include_attrs',
+                 '_used_external_types',
+                 '_std_options', '_mini_options', '_vmc_options',
+                 '_ecc_options',
+                 'unknown_attrs', 'unknown_funcs', 'unknown_calls',
+                 '_logfile', '_logfile2')
+
     ATTR_LOGFILE = '.pyarmor/project/rft_unknown_attrs.log'
     CALL_LOGFILE = '.pyarmor/project/rft_unknown_calls.log'
 
@@ -389,8 +735,13 @@ class Project:
         self._rft_filters = None
         self._rft_rulers = None
 
+        # Cache lines of multi-line options
+        self._rft_option_lines = None
+        self._rft_filter_lines = None
+
         self._rmodules = None
         self._builtins = None
+        self._srccache = None
 
         self._rft_type_rules = None
         self._rft_include_attrs = None
@@ -442,9 +793,11 @@ class Project:
         # Because the method "Fibo.runner" is called by dict
         # argument "**data", log it as
         #
-        #   self.unknown_funcs.append("foo:Fibo.runner")
+        #   self.unknown_funcs["foo:Fibo.runner"] = None
         #
-        self.unknown_funcs = []
+        # It's dict used as ordered set, so check membership quickly
+        #
+        self.unknown_funcs = {}
 
         # Log unknown caller with keyword arguments.
         #
@@ -646,6 +999,14 @@ class Project:
     def rft_opt(self, name):
         return self.rft_options.get(name)
 
+    def rft_opt_lines(self, name):
+        """Return lines of refactor option, split once and cached"""
+        if self._rft_option_lines is None:
+            self._rft_option_lines = {
+                k: v.splitlines() for k, v in self.rft_options.items()
+            }
+        return self._rft_option_lines.get(name, [])
+
     @property
     def rft_exclude_names(self):
         """Exclude module, class, function
@@ -660,18 +1021,12 @@ class Project:
         It supports pattern match as fnmatchcase
         Pattern only match one level
         """
-        value = self.rft_opt('exclude_names')
-        if value:
-            for x in value.splitlines():
-                yield x
+        return iter(self.rft_opt_lines('exclude_names'))
 
     @property
     def rft_exclude_funcs(self):
         """No touch arguments for listed functions"""
-        value = self.rft_opt('exclude_funcs')
-        if value:
-            for x in value.splitlines():
-                yield x
+        return iter(self.rft_opt_lines('exclude_funcs'))
 
     @property
     def rft_filters(self):
@@ -684,15 +1039,21 @@ class Project:
                 self._rft_filters = {}
         return self._rft_filters
 
+    def rft_filter_lines(self, name):
+        """Return lines of refactor filter, split once and cached"""
+        if self._rft_filter_lines is None:
+            self._rft_filter_lines = {
+                k: v.splitlines() for k, v in self.rft_filters.items()
+            }
+        return self._rft_filter_lines.get(name, [])
+
     @property
     def obf_include_strings(self):
         """A list of re pattern based on obf_string
 
         All matched string in ast.Tree will be transformed
         """
-        value = self.rft_filters.get('obf_include_strings', '')
-        for x in value.splitlines():
-            yield x
+        return iter(self.rft_filter_lines('obf_include_strings'))
 
     @property
     def obf_attr_filters(self):
@@ -701,9 +1062,7 @@ class Project:
         All matched ast.Attribute will be transformed to call
         setattr() or getattr() to hide attribute name
         """
-        value = self.rft_filters.get('obf_attr_filters', '')
-        for x in value.splitlines():
-            yield x
+        return iter(self.rft_filter_lines('obf_attr_filters'))
 
     @property
     def rft_rulers(self):
@@ -732,9 +1091,7 @@ class Project:
 
         Use rule "*.write -> *.write" to keep all write attribute
         """
-        value = self.rft_options.get('attr_rules', '')
-        for x in value.splitlines():
-            yield x
+        return iter(self.rft_opt_lines('attr_rules'))
 
     @property
     def rft_call_rules(self):
@@ -742,9 +1099,7 @@ class Project:
 
         If can't decide function type, use ruler to rename arg
         """
-        value = self.rft_options.get('call_rules', '')
-        for x in value.splitlines():
-            yield x
+        return iter(self.rft_opt_lines('call_rules'))
 
     @property
     def rft_arg_rules(self):
@@ -757,9 +1112,7 @@ class Project:
 
         This kind of rule could be used to rename string `msg`
         """
-        value = self.rft_options.get('rft_arg_rules', '')
-        for x in value.splitlines():
-            yield x
+        return iter(self.rft_opt_lines('rft_arg_rules'))
 
     @property
     def rft_type_rules(self):
@@ -853,8 +1206,7 @@ class Project:
     @property
     def builtins(self):
         if self._builtins is None:
-            import builtins
-            self._builtins = set(dir(builtins))
+            self._builtins = set(BUILTIN_NAMES)
         return self._builtins
 
     @property
@@ -905,6 +1257,21 @@ class Project:
                 self._rft_include_attrs.update(value.split())
         return self._rft_include_attrs
 
+    @property
+    def srccache(self):
+        """Source cache, None if it's disabled or not available"""
+        if self._srccache is None:
+            self._srccache = False
+            cfg = self.ctx.cfg
+            if cfg.getboolean('builder', 'enable_source_cache',
+                              fallback=False):
+                path = joinpath(self.ctx.home_path, 'cache', 'source',
+                                sys.implementation.cache_tag)
+                cache = SourceCache(path)
+                if cache.open():
+                    self._srccache = cache
+        return self._srccache if self._srccache else None
+
     def get_module(self, qualname):
         """Get module in the project by unique qualname
         It equals one dict: map_qualname_to_module
@@ -917,15 +1284,63 @@ class Project:
 
     def iter_module(self):
         """Iterate all modules in this project"""
-        for x in self._scripts:
-            yield x
-
-        for x in self._modules:
-            yield x
+        yield from self._scripts
+        yield from self._modules
 
         for child in self._packages + self._namespaces:
-            for x in child.iter_module():
-                yield x
+            yield from child.iter_module()
+
+    def parse_all(self, workers=None, optimize=None):
+        """Parse all the modules in this project by process pool
+
+        The modules in source tree cache are loaded directly, only
+        the others are parsed in worker processes
+
+        If optimize is not None, also compile these modules in the
+        workers. Do not set it if source tree will be refactored later
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        tasks = []
+        for m in self.iter_module():
+            if m._tree is None:
+                source = m._read_source()
+                m._tree = m._load_tree()
+                if m._tree is None:
+                    tasks.append((m, source))
+                elif optimize is not None:
+                    m._co = m._load_code(optimize)
+                    if m._co is None:
+                        m._co = compile(m._tree, m.abspath, 'exec',
+                                        optimize=optimize)
+                        m._dump_code(optimize)
+        if not tasks:
+            return
+
+        logger.info('parse %d modules ...', len(tasks))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(parse_source, (m.abspath, source, optimize))
+                for m, source in tasks
+            ]
+            for (m, _), future in zip(tasks, futures):
+                try:
+                    tree, co = future.result()
+                except Exception as e:
+                    # Worker failed or its result couldn't be sent
+                    # back, parse it in this process again
+                    logger.debug('parse %s in worker failed: %s',
+                                 m.qualname, e)
+                    m.parse_file(force=True)
+                    if optimize is not None:
+                        m.compile_file(optimize=optimize)
+                    continue
+                m._tree = tree
+                m._dump_tree()
+                if co is not None:
+                    m._co = marshal.loads(co)
+                    m._dump_code(optimize)
+        logger.info('parse %d modules end', len(tasks))
 
     def relsrc(self, path):
         return relpath(path, self.src)
@@ -950,17 +1365,18 @@ class Project:
         excludes = vlist('excludes') + list(GLOBAL_EXCLS)
         proexcls = [x.strip(':') for x in excludes
                     if x.find(':') < 1]
+        proexcls_re = compile_patterns(proexcls)
 
-        scripts = []
-        for pat in vlist('scripts'):
-            scripts.extend(search_item(src, pat, proexcls))
+        # Each directory in scripts and modules is only listed once
+        listdirs = {}
+        scripts = search_items(src, vlist('scripts'), proexcls,
+                               listdirs=listdirs, excludes_re=proexcls_re)
         self._scripts.extend([
             Script(self.relsrc(x), parent=self) for x in scripts
         ])
 
-        modules = []
-        for pat in vlist('modules'):
-            modules.extend(search_item(src, pat, proexcls))
+        modules = search_items(src, vlist('modules'), proexcls,
+                               listdirs=listdirs, excludes_re=proexcls_re)
 
         packages = vlist('packages')
         if packages:
@@ -992,16 +1408,19 @@ class Project:
                               excludes=excludes)
                 self._packages.append(obj)
             else:
-                files, dirs = scan_path(src, excludes=proexcls)
+                files, dirs = scan_path(src, excludes_re=proexcls_re)
                 modules.extend([joinpath(src, x) for x in files])
                 self._packages.extend([
                     Package(x, parent=self) for x in dirs
                 ])
 
         if scripts and modules:
-            for x in set(scripts) & set(modules):
-                logger.debug('duplicated %s', self.relsrc(x))
-                modules.remove(x)
+            script_set = set(scripts)
+            dups = script_set.intersection(modules)
+            if dups:
+                for x in dups:
+                    logger.debug('duplicated %s', self.relsrc(x))
+                modules = [x for x in modules if x not in script_set]
         self._modules.extend([
             Module(self.relsrc(x), parent=self) for x in modules
         ])
@@ -1029,7 +1448,7 @@ class Project:
 
     def log_unknown_func(self, func):
         if func not in self.unknown_funcs:
-            self.unknown_funcs.append(func)
+            self.unknown_funcs[func] = None
 
     def log_unknown_call(self, line):
         self.unknown_calls = True
@@ -1263,15 +1682,7 @@ class Project:
         modules = [x._as_dot() for x in self.modules]
         packages = [x._as_dot() for x in self.packages]
         sep = '\n' + GRAPHVIZ_INDENT * 2
-        return Template(dedent("""\
-        graph {
-          layout=osage
-          subgraph cluster_0 {
-            label="Project Structure";
-            $modules
-            $packages
-          }
-        }""")).substitute(
+        return GRAPHVIZ_PROJECT.format(
             modules=sep.join(modules),
             packages=sep.join('\n'.join(packages).splitlines())
         )
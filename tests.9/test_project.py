@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+
+import ast
+import configparser
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from unittest import mock
+
+from pyarmor.cli.project import (
+    Module, Project, parse_source, search_item, search_items
+)
+
+
+def parse_source_or_fail(args):
+    """Worker of parse_all which always fails for fail.py"""
+    if args[0].endswith('fail.py'):
+        raise RuntimeError('parse %s failed' % args[0])
+    return parse_source(args)
+
+
+class FakeContext:
+
+    def __init__(self, home, source_cache=False):
+        self.home_path = home
+        self.local_path = os.path.join(home, 'local')
+        self.cfg = configparser.ConfigParser()
+        self.cfg.read_dict({
+            'builder': {
+                'enable_source_cache': '1' if source_cache else '0'
+            }
+        })
+
+
+class BaseTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.work_path = tempfile.mkdtemp()
+        self.src = os.path.join(self.work_path, 'src')
+        os.makedirs(self.src)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_path, ignore_errors=True)
+
+    def make_file(self, name, source=''):
+        filename = os.path.join(self.src, name)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, 'w') as f:
+            f.write(source)
+        return filename
+
+    def make_project(self, data=None, source_cache=False):
+        ctx = FakeContext(self.work_path, source_cache=source_cache)
+        project = Project(ctx)
+        if data is not None:
+            data.setdefault('src', self.src)
+            project.load(data)
+        return project
+
+    def cache_files(self, project):
+        path = project.srccache.path
+        return sorted(x for x in os.listdir(path) if x != '.key')
+
+
+class SourceCacheTestCases(BaseTestCase):
+
+    def test_disabled_by_default(self):
+        self.make_file('foo.py', 'x = 1\n')
+        project = self.make_project({'modules': 'foo.py'})
+        self.assertIsNone(project.srccache)
+
+        m = project.get_module('foo')
+        m.compile_file()
+        self.assertIsNotNone(m._co)
+        self.assertFalse(os.path.exists(os.path.join(self.work_path,
+                                                     'cache')))
+
+    def test_standalone_module(self):
+        filename = self.make_file('foo.py', 'x = 1\n')
+        m = Module(filename)
+        m.compile_file()
+        ns = {}
+        exec(m._co, ns)
+        self.assertEqual(ns['x'], 1)
+
+    def test_cache_hit(self):
+        self.make_file('foo.py', '#!/usr/bin/env python\nx = 2\n')
+        project = self.make_project({'modules': 'foo.py'},
+                                    source_cache=True)
+        project.get_module('foo').compile_file()
+        self.assertEqual(len(self.cache_files(project)), 2)
+
+        project2 = self.make_project({'modules': 'foo.py'},
+                                     source_cache=True)
+        m = project2.get_module('foo')
+        m.parse_file()
+        self.assertEqual(m.shebang, '#!/usr/bin/env python\n')
+        m.compile_file(force=True)
+        ns = {}
+        exec(m._co, ns)
+        self.assertEqual(ns['x'], 2)
+
+    def test_code_hit_skips_tree(self):
+        self.make_file('foo.py', 'x = 6\n')
+        project = self.make_project({'modules': 'foo.py'},
+                                    source_cache=True)
+        project.get_module('foo').compile_file()
+
+        project2 = self.make_project({'modules': 'foo.py'},
+                                     source_cache=True)
+        m = project2.get_module('foo')
+        with mock.patch('pickle.loads') as loads, \
+             mock.patch('pyarmor.cli.project.compile') as compile_:
+            m.compile_file(keep_tree=False)
+        loads.assert_not_called()
+        compile_.assert_not_called()
+        self.assertIsNone(m.mtree)
+        ns = {}
+        exec(m._co, ns)
+        self.assertEqual(ns['x'], 6)
+
+        m.compile_file(force=True)
+        self.assertIsNotNone(m.mtree)
+
+    def test_dump_tree_failed(self):
+        self.make_file('foo.py', 'x = 7\n')
+        project = self.make_project({'modules': 'foo.py'},
+                                    source_cache=True)
+        m = project.get_module('foo')
+        # For example, too deep tree couldn't be pickled in Python 3.11-
+        with mock.patch('pickle.dumps', side_effect=RecursionError):
+            m.compile_file()
+        ns = {}
+        exec(m._co, ns)
+        self.assertEqual(ns['x'], 7)
+
+        # Only code object is cached, no temporary file left
+        files = self.cache_files(project)
+        self.assertEqual([x.endswith('.code') for x in files], [True])
+
+    def test_tampered_entry(self):
+        self.make_file('foo.py', 'x = 3\n')
+        project = self.make_project({'modules': 'foo.py'},
+                                    source_cache=True)
+        project.get_module('foo').compile_file()
+
+        path = project.srccache.path
+        for name in self.cache_files(project):
+            with open(os.path.join(path, name), 'r+b') as f:
+                data = bytearray(f.read())
+                data[-1] ^= 0xff
+                f.seek(0)
+                f.write(data)
+
+        project2 = self.make_project({'modules': 'foo.py'},
+                                     source_cache=True)
+        for name in self.cache_files(project2):
+            self.assertIsNone(project2.srccache.load(name, bytes))
+
+        m = project2.get_module('foo')
+        m.compile_file()
+        ns = {}
+        exec(m._co, ns)
+        self.assertEqual(ns['x'], 3)
+
+    def test_prune_expired_entries(self):
+        self.make_file('foo.py', 'x = 5\n')
+        project = self.make_project({'modules': 'foo.py'},
+                                    source_cache=True)
+        project.get_module('foo').compile_file()
+
+        path = project.srccache.path
+        files = self.cache_files(project)
+        expired = 1000000000
+        os.utime(os.path.join(path, files[0]), (expired, expired))
+
+        project2 = self.make_project(source_cache=True)
+        self.assertEqual(self.cache_files(project2), files[1:])
+
+    def test_insecure_cache_path(self):
+        self.make_file('foo.py', 'x = 8\n')
+        project = self.make_project({'modules': 'foo.py'},
+                                    source_cache=True)
+        path = project.srccache.path
+        keyfile = os.path.join(path, '.key')
+
+        os.chmod(path, 0o777)
+        self.assertIsNone(self.make_project(source_cache=True).srccache)
+        os.chmod(path, 0o700)
+        self.assertIsNotNone(self.make_project(source_cache=True).srccache)
+
+        os.chmod(keyfile, 0o644)
+        self.assertIsNone(self.make_project(source_cache=True).srccache)
+
+        with mock.patch('os.getuid', return_value=os.getuid() + 1):
+            self.assertIsNone(
+                self.make_project(source_cache=True).srccache)
+
+    def test_broken_cache_path(self):
+        self.make_file('foo.py', 'x = 4\n')
+        with open(os.path.join(self.work_path, 'cache'), 'w') as f:
+            f.write('not a directory')
+
+        project = self.make_project({'modules': 'foo.py'},
+                                    source_cache=True)
+        self.assertIsNone(project.srccache)
+        m = project.get_module('foo')
+        m.compile_file()
+        self.assertIsNotNone(m._co)
+
+
+class BuiltinsTestCases(BaseTestCase):
+
+    def test_builtins(self):
+        project = self.make_project()
+        names = project.builtins
+        self.assertIn('print', names)
+        self.assertIs(names, project.builtins)
+
+        names.add('my_builtin')
+        self.assertIn('my_builtin', project.builtins)
+        self.assertNotIn('my_builtin', self.make_project().builtins)
+
+
+class SearchTestCases(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for name in ('main.py', 'util.py', '.hidden.py', 'readme.txt',
+                     'pkg/__init__.py', 'pkg/a.py', 'pkg/b.pyw',
+                     'pkg/.hid/x.py', 'pkg/sub/__init__.py',
+                     'pkg/sub/c.py', 'tests/test_a.py'):
+            self.make_file(name)
+
+    def assert_same_result(self, pattern, excludes):
+        expected = search_item(self.src, pattern, excludes)
+        result = search_items(self.src, [pattern], excludes)
+        self.assertEqual(expected, result)
+        return result
+
+    def test_same_as_search_item(self):
+        sep = os.sep
+        patterns = [
+            '*.py', '.*', '*', 'm?in.py', '[mu]*.py', 'util.py',
+            'pkg/*.py', 'pkg/.*', 'pkg/sub/*', '*/*.py', 'pkg/*/',
+            'pkg' + sep, '*' + sep, 'nothing/*.py', 'nothing.py',
+            os.path.join(self.src, '*.py'),
+            os.path.join(self.src, 'pkg', '*.py*'),
+            os.path.join(self.src, '*', '__init__.py'),
+        ]
+        for excludes in ([], ['.*', '__pycache__'], ['util*', 'tests']):
+            for pattern in patterns:
+                with self.subTest(pattern=pattern, excludes=excludes):
+                    self.assert_same_result(pattern, excludes)
+
+    def test_unique_result(self):
+        result = search_items(self.src, ['*.py', 'util.py', 'm*.py'], [])
+        self.assertEqual(len(result), len(set(result)))
+        self.assertEqual(
+            sorted(result),
+            sorted(os.path.join(self.src, x) for x in ('main.py', 'util.py'))
+        )
+
+    def test_listed_once(self):
+        listdirs = {}
+        search_items(self.src, ['*.py', 'm*.py', 'pkg/*.py'], [],
+                     listdirs=listdirs)
+        self.assertEqual(sorted(listdirs),
+                         [self.src, os.path.join(self.src, 'pkg')])
+
+
+class ParseAllTestCases(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.make_file('main.py', '#!/usr/bin/env python\nimport pkg\n')
+        self.make_file('pkg/__init__.py', '"""Doc"""\nassert 1\n')
+        self.make_file('pkg/a.py', 'def f(x):\n    return x + 1\n')
+        self.make_file('pkg/fail.py', 'x = [1, 2]\ny = x[-1]\n')
+        self.data = {'scripts': 'main.py', 'packages': 'pkg'}
+
+    def serial_results(self, optimize):
+        project = self.make_project(dict(self.data))
+        result = {}
+        for m in project.iter_module():
+            m.parse_file()
+            tree = ast.dump(m.mtree)
+            m.compile_file(optimize=optimize)
+            result[m.qualname] = tree, m._co, m.shebang
+        return result
+
+    def parallel_results(self, optimize, source_cache=False):
+        project = self.make_project(dict(self.data),
+                                    source_cache=source_cache)
+        project.parse_all(workers=2, optimize=optimize)
+        return {
+            m.qualname: (ast.dump(m.mtree), m._co, m.shebang)
+            for m in project.iter_module()
+        }
+
+    def test_parse_all(self):
+        expected = self.serial_results(-1)
+        result = self.parallel_results(None)
+        self.assertEqual(sorted(expected), sorted(result))
+        for name, (tree, co, shebang) in result.items():
+            with self.subTest(module=name):
+                self.assertEqual(tree, expected[name][0])
+                self.assertIsNone(co)
+                self.assertEqual(shebang, expected[name][2])
+
+    def test_parse_and_compile_all(self):
+        for optimize in (0, 2):
+            expected = self.serial_results(optimize)
+            self.assertEqual(expected, self.parallel_results(optimize))
+
+    def test_worker_failed(self):
+        worker = 'pyarmor.cli.project.parse_source'
+        for optimize in (None, 0):
+            with self.subTest(optimize=optimize):
+                with mock.patch(worker, parse_source_or_fail), \
+                     self.assertLogs('cli.build', 'DEBUG') as cm:
+                    result = self.parallel_results(optimize)
+                failed = [x for x in cm.output if 'in worker failed' in x]
+                self.assertEqual(len(failed), 1)
+                self.assertIn('pkg.fail', failed[0])
+
+                expected = self.serial_results(
+                    -1 if optimize is None else optimize)
+                self.assertEqual(sorted(expected), sorted(result))
+                for name, (tree, co, shebang) in result.items():
+                    self.assertEqual(tree, expected[name][0])
+                    self.assertEqual(shebang, expected[name][2])
+                    if optimize is None:
+                        self.assertIsNone(co)
+                    else:
+                        self.assertEqual(co, expected[name][1])
+
+    def test_parse_all_with_cache(self):
+        expected = self.serial_results(0)
+        self.assertEqual(expected, self.parallel_results(0, True))
+        # Second time all the trees are got from cache
+        self.assertEqual(expected, self.parallel_results(0, True))
+
+
+if __name__ == '__main__':
+    logging.getLogger().addHandler(logging.NullHandler())
+    unittest.main(verbosity=2)